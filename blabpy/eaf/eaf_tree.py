@@ -14,13 +14,11 @@ TODO:
 """
 
 import functools
-from io import StringIO
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from xml.etree import ElementTree as element_tree
 
-import requests
-
-from blabpy.eaf.etree_utils import element_to_string, _make_find_xpath, no_text_in_element
+from blabpy.eaf.etree_utils import element_to_string, _make_find_xpath, no_text_in_element, url_to_tree
 
 
 class EafElement(object):
@@ -76,12 +74,20 @@ class Annotation(EafElement):
     TIME_SLOT_REF2 = 'TIME_SLOT_REF2'
     CVE_REF = 'CVE_REF'
 
+    _ALIGNABLE_ATTRIBUTES = frozenset({ID, TIME_SLOT_REF1, TIME_SLOT_REF2})
+    _REF_NECESSARY_ATTRIBUTES = frozenset({ID, ANNOTATION_REF})
+    _REF_CONDITIONAL_ATTRIBUTES = frozenset({CVE_REF})
+    _REF_ALL_ATTRIBUTES = _REF_NECESSARY_ATTRIBUTES | _REF_CONDITIONAL_ATTRIBUTES
+
     def __init__(self, annotation_element, eaf_tree, tier):
         # TODO: drop eaf_tree, return self.tier.eaf_tree in the eaf_tree property
         self._element = annotation_element
         self._eaf_tree = eaf_tree
         self.tier = tier
         self.validate()
+        # The inner element is never swapped for another one, so its tag can be read once. It is checked for every
+        # annotation in onset, offset, and all the type-specific properties.
+        self.annotation_type = self.inner_element.tag
         self._children = None
 
     def __repr__(self):
@@ -121,10 +127,6 @@ class Annotation(EafElement):
     def id(self):
         return self.inner_element.attrib[self.ID]
 
-    @property
-    def annotation_type(self):
-        return self.inner_element.tag
-
     @conditional_annotation_property(ALIGNABLE_ANNOTATION)
     def time_slot_ref1(self):
         return self.inner_element.attrib[self.TIME_SLOT_REF1]
@@ -231,19 +233,17 @@ class Annotation(EafElement):
         if inner_element.text and not inner_element.text.isspace():
             raise ValueError(f'Inner annotation element must not have text.')
 
-        attribute_names = set(inner_element.attrib.keys())
+        attribute_names = inner_element.attrib.keys()
         if inner_element.tag == self.ALIGNABLE_ANNOTATION:
-            if attribute_names != {'ANNOTATION_ID', 'TIME_SLOT_REF1', 'TIME_SLOT_REF2'}:
+            if attribute_names != self._ALIGNABLE_ATTRIBUTES:
                 raise ValueError(f'ALIGNABLE_ANNOTATION must have {self.ID}, {self.TIME_SLOT_REF1},'
                                  f' and {self.TIME_SLOT_REF2} attributes.')
         elif inner_element.tag == self.REF_ANNOTATION:
-            necessary_attributes = {'ANNOTATION_ID', 'ANNOTATION_REF'}
-            conditional_attributes = {'CVE_REF'}
-            if not necessary_attributes.issubset(attribute_names):
+            if not self._REF_NECESSARY_ATTRIBUTES <= attribute_names:
                 raise ValueError(f'REF_ANNOTATION must have {self.ID} and {self.ANNOTATION_REF} attributes.')
-            if not attribute_names.issubset(necessary_attributes.union(conditional_attributes)):
-                raise ValueError(f'REF_ANNOTATION must not have any other attributes than {necessary_attributes} and '
-                                 f'{conditional_attributes}.')
+            if not attribute_names <= self._REF_ALL_ATTRIBUTES:
+                raise ValueError(f'REF_ANNOTATION must not have any other attributes than '
+                                 f'{set(self._REF_NECESSARY_ATTRIBUTES)} and {set(self._REF_CONDITIONAL_ATTRIBUTES)}.')
         else:
             raise ValueError(f'Unknown annotation type: {inner_element.tag}')
 
@@ -255,7 +255,7 @@ class Annotation(EafElement):
 
         # For tiers with controlled vocabularies, check that CVE_REF and annotation value are both present and
         # consistent or both absent.
-        if self.eaf_tree.validate_cv_entries and self.annotation_type == self.REF_ANNOTATION and self.tier.uses_cv:
+        if self.eaf_tree.validate_cv_entries and inner_element.tag == self.REF_ANNOTATION and self.tier.uses_cv:
             not_empty = not self.value_not_set()
             cve_ref = self.inner_element.attrib.get(self.CVE_REF)
             has_cve_ref = cve_ref is not None
@@ -322,6 +322,9 @@ class Tier(EafElement):
     LINGUISTIC_TYPE_REF = 'LINGUISTIC_TYPE_REF'
     PARENT_REF = 'PARENT_REF'
     PARTICIPANT = 'PARTICIPANT'
+    NECESSARY_ATTRIBUTES = frozenset({LINGUISTIC_TYPE_REF, ID})
+    POSSIBLE_EXTRA_ATTRIBUTES = frozenset({PARENT_REF, PARTICIPANT})
+    _ALL_ATTRIBUTES = NECESSARY_ATTRIBUTES | POSSIBLE_EXTRA_ATTRIBUTES
 
     def __init__(self, tier_element, eaf_tree):
         self._element = tier_element
@@ -410,14 +413,12 @@ class Tier(EafElement):
     def validate(self):
         if self.element.tag != self.TAG:
             raise ValueError(f'Tier element must have {self.TAG} as its tag.')
-        necessary_attributes = {self.LINGUISTIC_TYPE_REF, self.ID}
-        possible_extra_attributes = {self.PARENT_REF, self.PARTICIPANT}
-        attribute_names = set(self.element.attrib.keys())
-        if not necessary_attributes.issubset(attribute_names):
+        attribute_names = self.element.attrib.keys()
+        if not self.NECESSARY_ATTRIBUTES <= attribute_names:
             raise ValueError(f'Tier element must have {self.LINGUISTIC_TYPE_REF} and {self.ID} attributes.')
-        if not attribute_names.issubset(necessary_attributes.union(possible_extra_attributes)):
-            raise ValueError(f'Tier element must not have any other attributes than {necessary_attributes} and '
-                             f'{possible_extra_attributes}.')
+        if not attribute_names <= self._ALL_ATTRIBUTES:
+            raise ValueError(f'Tier element must not have any other attributes than {set(self.NECESSARY_ATTRIBUTES)} '
+                             f'and {set(self.POSSIBLE_EXTRA_ATTRIBUTES)}.')
         self._validate_no_text()
 
     def add_reference_annotation(self, annotation_id, parent_annotation_id):
@@ -458,11 +459,12 @@ class LinguisticType(EafElement):
     ID = 'LINGUISTIC_TYPE_ID'
     TIME_ALIGNABLE = 'TIME_ALIGNABLE'
     GRAPHIC_REFERENCES = 'GRAPHIC_REFERENCES'
-    NECESSARY_ATTRIBUTES = {ID, TIME_ALIGNABLE, GRAPHIC_REFERENCES}
+    NECESSARY_ATTRIBUTES = frozenset({ID, TIME_ALIGNABLE, GRAPHIC_REFERENCES})
 
     CONSTRAINTS = 'CONSTRAINTS'
     CONTROLLED_VOCABULARY_REF = 'CONTROLLED_VOCABULARY_REF'
-    POSSIBLE_EXTRA_ATTRIBUTES = {CONSTRAINTS, CONTROLLED_VOCABULARY_REF}
+    POSSIBLE_EXTRA_ATTRIBUTES = frozenset({CONSTRAINTS, CONTROLLED_VOCABULARY_REF})
+    _ALL_ATTRIBUTES = NECESSARY_ATTRIBUTES | POSSIBLE_EXTRA_ATTRIBUTES
 
     def __init__(self, linguistic_type_element, eaf_tree):
         self._element = linguistic_type_element
@@ -503,12 +505,12 @@ class LinguisticType(EafElement):
     def validate(self):
         if self.element.tag != self.TAG:
             raise ValueError(f'LinguisticType element must have {self.TAG} as its tag.')
-        attribute_names = set(self.element.attrib.keys())
-        if not self.NECESSARY_ATTRIBUTES.issubset(attribute_names):
-            raise ValueError(f'LinguisticType element must have {self.NECESSARY_ATTRIBUTES} attributes.')
-        if not attribute_names.issubset(self.NECESSARY_ATTRIBUTES.union(self.POSSIBLE_EXTRA_ATTRIBUTES)):
-            raise ValueError(f'LinguisticType element must not have any other attributes than {self.NECESSARY_ATTRIBUTES} '
-                             f'and {self.POSSIBLE_EXTRA_ATTRIBUTES}.')
+        attribute_names = self.element.attrib.keys()
+        if not self.NECESSARY_ATTRIBUTES <= attribute_names:
+            raise ValueError(f'LinguisticType element must have {set(self.NECESSARY_ATTRIBUTES)} attributes.')
+        if not attribute_names <= self._ALL_ATTRIBUTES:
+            raise ValueError(f'LinguisticType element must not have any other attributes than '
+                             f'{set(self.NECESSARY_ATTRIBUTES)} and {set(self.POSSIBLE_EXTRA_ATTRIBUTES)}.')
         self._validate_no_text()
 
 
@@ -516,7 +518,8 @@ class ControlledVocabularyEntry(EafElement):
     TAG = 'CV_ENTRY_ML'
     ID = 'CVE_ID'
     CVE_VALUE = 'CVE_VALUE'
-    ALL_ATTRIBUTES = {ID}
+    ALL_ATTRIBUTES = frozenset({ID})
+    _VALUE_ATTRIBUTES = frozenset({'DESCRIPTION', 'LANG_REF'})
 
     def __init__(self, cv_entry_element):
         """
@@ -542,15 +545,14 @@ class ControlledVocabularyEntry(EafElement):
     def validate(self):
         if self.element.tag != self.TAG:
             raise ValueError(f'Controlled vocabulary entry element must have {self.TAG} as its tag.')
-        attribute_names = set(self.element.attrib.keys())
-        if self.ALL_ATTRIBUTES != attribute_names:
-            raise ValueError(f'Controlled vocabulary entry element must have {self.ALL_ATTRIBUTES} attributes and only'
-                             f' them.')
+        if self.element.attrib.keys() != self.ALL_ATTRIBUTES:
+            raise ValueError(f'Controlled vocabulary entry element must have {set(self.ALL_ATTRIBUTES)} attributes and '
+                             f'only them.')
 
         (self._value_element, ) = self.element
         if self._value_element.tag != self.CVE_VALUE:
             raise ValueError(f'Controlled vocabulary entry element must have {self.CVE_VALUE} as its child element.')
-        if self._value_element.attrib.keys() != {'DESCRIPTION', 'LANG_REF'}:
+        if self._value_element.attrib.keys() != self._VALUE_ATTRIBUTES:
             raise ValueError(f'Controlled vocabulary entry element must have DESCRIPTION and LANG_REF attributes.')
         if not self._value_element.text:
             raise ValueError(f'Controlled vocabulary entry element must have text.')
@@ -562,8 +564,9 @@ class ControlledVocabulary(EafElement):
     DESCRIPTION = 'DESCRIPTION'
     EXT_REF = 'EXT_REF'
     # TODO: it isn't necessary to have EXT_REF, the CV can be defined in the element itself. Allow for that.
-    NECESSARY_ATTRIBUTES = {ID}
-    POSSIBLE_EXTRA_ATTRIBUTES = {EXT_REF}
+    NECESSARY_ATTRIBUTES = frozenset({ID})
+    POSSIBLE_EXTRA_ATTRIBUTES = frozenset({EXT_REF})
+    _ALL_ATTRIBUTES = NECESSARY_ATTRIBUTES | POSSIBLE_EXTRA_ATTRIBUTES
 
     def __init__(self, cv_element, eaf_tree):
         self._element = cv_element
@@ -605,9 +608,17 @@ class ControlledVocabulary(EafElement):
         else:
             return self._entries
 
+    @functools.cached_property
+    def _value_to_ids(self):
+        # Index used by get_id_of_value which is called every time an annotation value is set on a tier with a CV.
+        value_to_ids = dict()
+        for cve_id, cv_entry in self.entries.items():
+            value_to_ids.setdefault(cv_entry.value, []).append(cve_id)
+        return value_to_ids
+
     def get_id_of_value(self, value):
         try:
-            (cve_id,) = {cve_id for cve_id, cv_entry in self.entries.items() if cv_entry.value == value}
+            (cve_id,) = self._value_to_ids.get(value, ())
         except ValueError:
             raise ValueError(f'Value {value} is not in the controlled vocabulary.')
         return cve_id
@@ -615,12 +626,12 @@ class ControlledVocabulary(EafElement):
     def validate(self):
         if self.element.tag != self.TAG:
             raise ValueError(f'Controlled vocabulary element must have {self.TAG} as its tag.')
-        attribute_names = set(self.element.attrib.keys())
-        if not self.NECESSARY_ATTRIBUTES.issubset(attribute_names):
-            raise ValueError(f'Controlled vocabulary element must have {self.NECESSARY_ATTRIBUTES} attributes.')
-        if not attribute_names.issubset(self.NECESSARY_ATTRIBUTES.union(self.POSSIBLE_EXTRA_ATTRIBUTES)):
+        attribute_names = self.element.attrib.keys()
+        if not self.NECESSARY_ATTRIBUTES <= attribute_names:
+            raise ValueError(f'Controlled vocabulary element must have {set(self.NECESSARY_ATTRIBUTES)} attributes.')
+        if not attribute_names <= self._ALL_ATTRIBUTES:
             raise ValueError(f'Controlled vocabulary element must not have any other attributes than '
-                             f'{self.NECESSARY_ATTRIBUTES} and {self.POSSIBLE_EXTRA_ATTRIBUTES}.')
+                             f'{set(self.NECESSARY_ATTRIBUTES)} and {set(self.POSSIBLE_EXTRA_ATTRIBUTES)}.')
         self._validate_no_text()
 
     def parse(self):
@@ -643,12 +654,16 @@ class ExternalReference(EafElement):
     ID = 'EXT_REF_ID'
     TYPE = 'TYPE'
     VALUE = 'VALUE'
-    NECESSARY_ATTRIBUTES = {ID, TYPE, VALUE}
+    NECESSARY_ATTRIBUTES = frozenset({ID, TYPE, VALUE})
 
     def __init__(self, ext_ref_element):
         self._element = ext_ref_element
         self.validate()
-        self.cv_resource = self.parse()
+
+    @functools.cached_property
+    def cv_resource(self):
+        # Fetched on first use: for http urls, this is a network request that most uses of EafTree never need.
+        return self.parse()
 
     def __repr__(self):
         return f'<ExternalReference {self.ext_ref_id} {self.type} {self.value}>'
@@ -668,9 +683,8 @@ class ExternalReference(EafElement):
     def validate(self):
         if self.element.tag != self.TAG:
             raise ValueError(f'External reference element must have {self.TAG} as its tag.')
-        attribute_names = set(self.element.attrib.keys())
-        if not self.NECESSARY_ATTRIBUTES.issubset(attribute_names):
-            raise ValueError(f'External reference element must have {self.NECESSARY_ATTRIBUTES} '
+        if not self.NECESSARY_ATTRIBUTES <= self.element.attrib.keys():
+            raise ValueError(f'External reference element must have {set(self.NECESSARY_ATTRIBUTES)} '
                              f'attributes.')
         self._validate_no_text()
 
@@ -693,12 +707,7 @@ class XMLTree(object):
 
     @classmethod
     def from_url(cls, url, *args, **kwargs):
-        u = requests.get(url)
-        with StringIO() as f:
-            f.write(u.content.decode())
-            f.seek(0)
-            tree = element_tree.parse(f)
-        return cls(tree, *args, **kwargs)
+        return cls(url_to_tree(url), *args, **kwargs)
 
     @classmethod
     def from_uri(cls, uri, *args, **kwargs):
@@ -714,16 +723,8 @@ class XMLTree(object):
         return element_to_string(self.tree.getroot(), children=True)
 
     def to_file(self, path):
-        Path(path).write_text(self.to_string())
-
-    @staticmethod
-    def _make_find_xpath(tag, **attributes):
-        if attributes:
-            attribute_filters = [f'@{name}="{value}"' for name, value in attributes.items()]
-            attributes_filter = '[' + ' and '.join(attribute_filters) + ']'
-        else:
-            attributes_filter = ''
-        return f'.//{tag}{attributes_filter}'
+        with Path(path).open('w') as f:
+            element_to_string(self.tree.getroot(), children=True, out=f)
 
     def find_element(self, tag, **attributes):
         return self.tree.find(_make_find_xpath(tag, **attributes))
@@ -804,6 +805,9 @@ class EafTree(XMLTree):
         self.validate_cv_entries = validate_cv_entries
 
         self.external_references = self._parse_elements(ExternalReference)
+        # Validating annotations will need the external CVs, get them all at once instead of one at a time.
+        if validate_cv_entries and self.find_element(Annotation.TAG) is not None:
+            self._prefetch_external_refs()
         self.controlled_vocabularies = self._parse_elements(ControlledVocabulary, eaf_tree=self)
         self.linguistic_types = self._parse_elements(LinguisticType, eaf_tree=self)
         self.tiers = self._parse_elements(Tier, eaf_tree=self)
@@ -818,6 +822,20 @@ class EafTree(XMLTree):
         elements = [element_class(element, *args, **kwargs) for element in self.find_elements(element_class.TAG)]
         return {element.id: element for element in elements}
 
+    def _prefetch_external_refs(self):
+        """
+        Fetches CV resources of all external references in parallel so that the total wait is that of the slowest
+        request rather than the sum of all of them.
+        """
+        not_fetched = [ext_ref for ext_ref in self.external_references.values()
+                       if 'cv_resource' not in vars(ext_ref)]
+        if len(not_fetched) < 2:
+            return
+        with ThreadPoolExecutor(max_workers=len(not_fetched)) as executor:
+            cv_resources = list(executor.map(ExternalReference.parse, not_fetched))
+        for ext_ref, cv_resource in zip(not_fetched, cv_resources):
+            ext_ref.cv_resource = cv_resource
+
     @property
     def last_used_annotation_id(self) -> int:
         return max(int(annotation_id[1:]) for annotation_id in self.annotations)
@@ -3,7 +3,7 @@ Functions to facilitate working with xml.etree.ElementTree.Element objects. Ther
 consistency. Consider putting all function in an ElementTreePlus class.
 """
 
-from io import StringIO
+import functools
 from pathlib import Path
 from xml.etree import ElementTree as element_tree
 
@@ -15,13 +15,16 @@ def path_to_tree(path):
         return element_tree.parse(f)
 
 
+# Shared by all url fetches so that repeated requests to the same host (e.g., several .ecv files on GitHub) reuse an open
+# connection instead of doing a new TCP and TLS handshake each time.
+_SESSION = requests.Session()
+
+
 def url_to_tree(url: str):
-    u = requests.get(url)
-    with StringIO() as f:
-        f.write(u.content.decode())
-        f.seek(0)
-        tree = element_tree.parse(f)
-    return tree
+    with _SESSION.get(url, stream=True) as response:
+        # Parse straight from the response stream instead of reading, decoding, and copying the whole body first.
+        response.raw.decode_content = True
+        return element_tree.parse(response.raw)
 
 
 def uri_to_tree(uri):
@@ -82,14 +85,19 @@ def indent(tree, space="  ", level=0):
     _indent_children(tree, 0)
 
 
-def element_to_string(element, children=True):
+def element_to_string(element, children=True, out=None):
+    """
+    Serializes an element as indented canonical XML.
+    :param out: optional text file-like object. If provided, the XML is written there piece by piece instead of being
+    assembled into a string, and None is returned.
+    """
     if isinstance(element, element_tree.ElementTree):
         element = element.getroot()
     if not children:
         element = element.makeelement(element.tag, element.attrib)
     spacing = 4 * ' '
     indent(element, space=spacing)
-    return element_tree.canonicalize(element_tree.tostring(element, xml_declaration=True, encoding='utf-8'))
+    return element_tree.canonicalize(element_tree.tostring(element, xml_declaration=True, encoding='utf-8'), out=out)
 
 
 def tree_to_string(tree):
@@ -97,7 +105,8 @@ def tree_to_string(tree):
 
 
 def tree_to_path(tree, path):
-    Path(path).write_text(tree_to_string(tree))
+    with Path(path).open('w') as f:
+        element_to_string(tree.getroot(), children=True, out=f)
 
 
 def get_all(tree, tag, id_attrib):
@@ -105,15 +114,26 @@ def get_all(tree, tag, id_attrib):
             for element in tree.findall(f'.//{tag}')}
 
 
-def _make_find_xpath(tag, **attributes):
+@functools.lru_cache(maxsize=256)
+def _compile_find_xpath(tag, attributes):
+    """
+    Cached part of _make_find_xpath. ElementPath caches compiled selectors by the path string, so returning the same
+    string for the same query lets repeated find/findall calls skip both the string assembly and the compilation.
+    :param tag: element tag
+    :param attributes: tuple of (name, value) pairs sorted by name
+    """
     if attributes:
-        attribute_filters = [f'@{name}="{value}"' for name, value in attributes.items()]
+        attribute_filters = [f'@{name}="{value}"' for name, value in attributes]
         attributes_filter = '[' + ' and '.join(attribute_filters) + ']'
     else:
         attributes_filter = ''
     return f'.//{tag}{attributes_filter}'
 
 
+def _make_find_xpath(tag, **attributes):
+    return _compile_find_xpath(tag, tuple(sorted(attributes.items())))
+
+
 def find_element(tree, tag, **attributes):
     return tree.find(_make_find_xpath(tag, **attributes))
 
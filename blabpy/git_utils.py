@@ -28,12 +28,12 @@ def trust_folder(folder: Path):
         safe_directories = global_config.get_values('safe', 'directory')
     except KeyError:
         safe_directories = list()
-    for safe_directory in safe_directories:
-        if folder.resolve() == Path(safe_directory):
-            return
+    resolved_folder = folder.resolve()
+    if resolved_folder in {Path(safe_directory) for safe_directory in safe_directories}:
+        return
 
     # Mark the folder as trusted
-    posix_path = folder.resolve().as_posix()
+    posix_path = resolved_folder.as_posix()
     global_config.add_value('safe', 'directory', posix_path)
 
 
@@ -134,8 +134,8 @@ def sparse_clone(remote_uri, folder_to_clone_into,
     # Make sure that the folder to clone to, exists and is empty.
     # mkdir -p "$folder_to_clone_into" && cd "$folder_to_clone_into" && [ "$(ls -A "$folder_to_clone_into")" ]
     folder_to_clone_into = Path(folder_to_clone_into)
-    if Path(folder_to_clone_into).exists():
-        if len(list(Path(folder_to_clone_into).iterdir())) > 0:
+    if folder_to_clone_into.exists():
+        if any(folder_to_clone_into.iterdir()):
             raise ValueError(f'The folder {folder_to_clone_into} already exists and is not empty.')
     else:
         folder_to_clone_into.mkdir(parents=True, exist_ok=True)
@@ -2,6 +2,7 @@
 Functions to facilitate working with LENA's .its files.
 """
 import datetime
+import functools
 from pathlib import Path
 from xml.etree.ElementTree import ElementTree, XMLParser
 
@@ -10,6 +11,30 @@ import pytz
 
 from blabpy import ANONYMIZATION_DATE
 
+# lxml is optional: if it is installed, .its files are parsed with libxml2 which is several times faster than the
+# standard library parser on these large files. Both produce elements with the same find/findall/items interface.
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+
+# Number of bytes read from an .its file at a time in Its.from_path.
+_PARSE_CHUNK_SIZE = 1 << 16
+
+# Durations in .its files look like "PT3617.45S". Hours and minutes are allowed in case other LENA versions use them.
+ISO_DURATION_REGEX = (r'^PT(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?'
+                      r'(?:(?P<seconds>\d+)(?:\.(?P<fraction>\d+))?S)?$')
+
+
+@functools.lru_cache(maxsize=128)
+def _get_pytz_timezone(timezone_name):
+    """
+    pytz.timezone with the result cached for each name: when many .its files are loaded with the same forced timezone,
+    the name only has to be normalized and looked up once.
+    """
+    return pytz.timezone(timezone_name)
+
 
 class ItsNoTimeZoneInfo(Exception):
     pass
@@ -31,12 +56,14 @@ class Its(object):
         if forced_timezone is not None:
             forced_timezone = self._parse_forced_timezone(forced_timezone)
         self.forced_timezone = forced_timezone
+        # Filled in by get_timezone_info on first call
+        self._timezone_info = None
 
     @staticmethod
     def _parse_forced_timezone(forced_timezone_str):
         # convert forced_timezone to a pytz timezone object
         try:
-            forced_timezone = pytz.timezone(forced_timezone_str)
+            forced_timezone = _get_pytz_timezone(forced_timezone_str)
         except pytz.UnknownTimeZoneError:
             raise ValueError(f'Unknown timezone: {forced_timezone_str}. Timezone must be a string recognized by'
                              ' `pytz.timezone`, such as "US/Eastern".')
@@ -55,9 +82,14 @@ class Its(object):
         :param forced_timezone: see __init__'s docstring
         :return: Its object with its_contents parsed
         """
-        parser = XMLParser()
-        parser.feed(its_contents)
-        xml_parsed = parser.close()
+        if lxml_etree is not None:
+            # The string has already been decoded, so the encoding declared in the file, if any, must be ignored.
+            parser = lxml_etree.XMLParser(encoding='utf-8', huge_tree=True, collect_ids=False)
+            xml_parsed = lxml_etree.fromstring(its_contents.encode('utf-8'), parser=parser)
+        else:
+            parser = XMLParser()
+            parser.feed(its_contents)
+            xml_parsed = parser.close()
 
         return Its(xml_parsed=xml_parsed, forced_timezone=forced_timezone)
 
@@ -69,12 +101,25 @@ class Its(object):
         :param forced_timezone: see __init__'s docstring
         :return: Its object
         """
-        its_path = Path(its_path)
-        return cls.from_string(its_contents=its_path.read_text(), forced_timezone=forced_timezone)
+        if lxml_etree is not None:
+            parser = lxml_etree.XMLParser(huge_tree=True, collect_ids=False)
+        else:
+            parser = XMLParser()
+
+        # Feed the raw bytes in chunks instead of reading the whole file into a string first: the parser then never
+        # has to hold a full copy of the file next to the tree it is building.
+        with Path(its_path).open('rb') as f:
+            for chunk in iter(lambda: f.read(_PARSE_CHUNK_SIZE), b''):
+                parser.feed(chunk)
+        xml_parsed = parser.close()
+
+        return Its(xml_parsed=xml_parsed, forced_timezone=forced_timezone)
 
     def get_timezone_info(self):
         if self.forced_timezone is not None:
             return self.forced_timezone
+        if self._timezone_info is not None:
+            return self._timezone_info
 
         timezone_xml_path = './ProcessingUnit/UPL_Header/TransferredUPL/RecordingInformation/Audio/TimeZone'
         timezone_element = self.xml.find(timezone_xml_path)
@@ -82,7 +127,9 @@ class Its(object):
             raise ItsNoTimeZoneInfo('I wasn\'t able to locate timezone info in this .its file')
 
         timezone_info = dict(timezone_element.items())
-        return dict(seconds_offset=timezone_info['StandardSecondsOffset'], uses_dst=timezone_info['UsesDST'])
+        self._timezone_info = dict(seconds_offset=timezone_info['StandardSecondsOffset'],
+                                   uses_dst=timezone_info['UsesDST'])
+        return self._timezone_info
 
     def _convert_utc_to_local(self, clock_time: pd.Series):
         """
@@ -117,6 +164,18 @@ class Its(object):
         :param iso_time: pd.Series of ISO duration values
         :return: pd.Series of ints
         """
+        # Parse the fields as integers directly: going through float seconds is slower and can be off by a millisecond,
+        # e.g., "PT259.02S" used to become 259019 ms.
+        parts = iso_time.str.extract(ISO_DURATION_REGEX)
+        if iso_time.str.fullmatch(ISO_DURATION_REGEX).all():
+            # Sub-millisecond digits, if any, are dropped.
+            milliseconds = parts.fraction.str[:3].str.ljust(3, '0')
+            return (parts.hours.fillna('0').astype('int64') * 3_600_000
+                    + parts.minutes.fillna('0').astype('int64') * 60_000
+                    + parts.seconds.fillna('0').astype('int64') * 1000
+                    + milliseconds.fillna('0').astype('int64'))
+
+        # Anything else, e.g., durations with days, is left to pandas
         return (pd.to_timedelta(iso_time)  # parse ISO-formatted times
                 .dt.total_seconds()  # convert to seconds as real numbers
                 .multiply(1000)  # convert from s to ms
@@ -143,12 +202,19 @@ class Its(object):
         # *ClockTime - UTC time when recordings started/ended
         # *Time - ISO-formatted duration of time from the start of the wav to the start/end of the recording
 
-        # Convert *ClockTime to local time and startTime and endTime to milliseconds
+        # Convert *ClockTime to local time in a single pass over both columns, then split them back
+        n_sub_recordings = len(sub_recordings)
+        clock_times = pd.concat([sub_recordings.startClockTime, sub_recordings.endClockTime], ignore_index=True)
+        local_times = self._convert_utc_to_local(clock_times)
+        start_dt = local_times.iloc[:n_sub_recordings].set_axis(sub_recordings.index)
+        end_dt = local_times.iloc[n_sub_recordings:].set_axis(sub_recordings.index)
+
+        # Convert startTime and endTime to milliseconds
         sub_recordings = (
             sub_recordings
             .assign(
-                start_dt=lambda df: self._convert_utc_to_local(df.startClockTime),
-                end_dt=lambda df: self._convert_utc_to_local(df.endClockTime),
+                start_dt=start_dt,
+                end_dt=end_dt,
                 start_ms=lambda df: self._convert_iso_duration_to_ms(df.startTime),
                 end_ms=lambda df: self._convert_iso_duration_to_ms(df.endTime))
             [['start_dt', 'end_dt', 'start_ms', 'end_ms']]
@@ -1,3 +1,5 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 from tqdm import tqdm
@@ -20,6 +22,24 @@ def _extract_aclew_data_from_one_file(eaf_path):
         raise Exception(f'Error extracting annotations from:\n{eaf_path}') from e
 
 
+def _iter_eaf_paths(folder, recursive=True):
+    """
+    Yields paths to EAF files in a folder. Uses os.scandir directly: unlike Path.glob, it doesn't create a Path object
+    for every entry and can usually tell files from folders without an extra stat call. Like Path.glob, doesn't follow
+    symlinks to folders. Unlike Path.glob, skips folders whose names end with ".eaf".
+    """
+    folders = [folder]
+    while folders:
+        with os.scandir(folders.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        folders.append(entry.path)
+                # normcase makes the check case-insensitive on Windows, same as glob
+                elif os.path.normcase(entry.name).endswith('.eaf'):
+                    yield Path(entry.path)
+
+
 def find_eaf_paths(path, recursive=True):
     """
     Finds EAF files in a directory.
@@ -37,17 +57,18 @@ def find_eaf_paths(path, recursive=True):
         assert path.suffix == '.eaf', 'if a file path, must be a path to an EAF file'
         eaf_paths = [path]
     elif path.is_dir():
-        glob_pattern = '*.eaf'
-        if recursive:
-            glob_pattern = '**/' + glob_pattern
-        eaf_paths = sorted(list(path.glob(glob_pattern)))
+        eaf_paths = sorted(_iter_eaf_paths(path, recursive=recursive))
         assert len(eaf_paths) > 0, 'no EAF files found in {}'.format(path)
     else:
         raise ValueError('path must be a file or a directory')
     return eaf_paths
 
 
-def extract_aclew_data(path, recursive=True, show_tqdm_pbar=False):
+# With fewer files than this, starting the worker processes takes longer than parsing the files in the main one.
+_MIN_FILES_FOR_PROCESS_POOL = 4
+
+
+def extract_aclew_data(path, recursive=True, show_tqdm_pbar=False, n_jobs=None):
     """
     Extracts annotations from EAF files with ACLEW-style annotations. Returns two tables: annotations and intervals.
 
@@ -59,19 +80,26 @@ def extract_aclew_data(path, recursive=True, show_tqdm_pbar=False):
 
     :param path: path to a folder with EAF files or a single EAF file.
     :param recursive: If path is a folder, whether to search for EAF files recursively - in subfolders, subsubfolders,
-    :param show_tqdm_pbar: Should we print a tqdm progress bar?
     etc.
+    :param show_tqdm_pbar: Should we print a tqdm progress bar?
+    :param n_jobs: Number of processes to parse the EAF files in. Defaults to the number of CPUs. With n_jobs=1 or only a
+    few files, everything is done in the current process. On Windows, calling this function with n_jobs other than 1
+    from a script requires the usual `if __name__ == '__main__':` guard.
     :return: annotations, intervals - two pandas dataframes.
     """
     eaf_paths = find_eaf_paths(path, recursive=recursive)
-    if show_tqdm_pbar:
-        eaf_paths = tqdm(eaf_paths)
-
-    def extract_from_one_file(eaf_path):
-        # return (annotations, intervals, filename) tuple
-        return *_extract_aclew_data_from_one_file(eaf_path), eaf_path.name
-    annotations, intervals, filenames = (
-        zip(*(extract_from_one_file(eaf_path) for eaf_path in eaf_paths)))
+    filenames = [eaf_path.name for eaf_path in eaf_paths]
+    n_jobs = n_jobs or os.cpu_count() or 1
+
+    if n_jobs == 1 or len(eaf_paths) < _MIN_FILES_FOR_PROCESS_POOL:
+        results = list(tqdm(map(_extract_aclew_data_from_one_file, eaf_paths),
+                            total=len(eaf_paths), disable=not show_tqdm_pbar))
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(eaf_paths))) as executor:
+            # map keeps the results in the same order as eaf_paths
+            results = list(tqdm(executor.map(_extract_aclew_data_from_one_file, eaf_paths, chunksize=4),
+                                total=len(eaf_paths), disable=not show_tqdm_pbar))
+    annotations, intervals = zip(*results)
 
     def concatenate(dataframes):
         return concatenate_dataframes(
@@ -1,3 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 import pandas as pd
 import numpy as np
 from tqdm import tqdm
@@ -38,6 +41,28 @@ COLUMNS_BY_MODALITY = {
                  'pho']
 }
 
+# Text columns are read as strings directly so that pandas doesn't have to infer their types. The keys are the column
+# names as they are in the files, i.e., before COLUMN_NAME_MAPPER is applied. Some video files have "labeled_object."
+# prepended to all column names and some don't have it for some of the columns (e.g., basic_level), so both versions are
+# listed for video.
+_STRING_COLUMNS = ['tier', 'object', 'utterance_type', 'object_present', 'speaker', 'timestamp', 'basic_level',
+                   'annotid', 'pho']
+RAW_DTYPES_BY_MODALITY = {
+    AUDIO: {('word' if column == 'object' else column): str for column in _STRING_COLUMNS},
+    VIDEO: {**{raw_column: str
+               for column in _STRING_COLUMNS
+               for raw_column in (column, f'labeled_object.{column}')},
+            'labeled_object.id': str}
+}
+
+
+def _is_used_column(raw_column_name, modality):
+    """
+    Checks whether a column from a basic level file of a given modality is kept after its name is normalized.
+    Used as read_csv's usecols argument so that the rest of the columns aren't parsed at all.
+    """
+    return COLUMN_NAME_MAPPER[modality](raw_column_name) in COLUMNS_BY_MODALITY[modality]
+
 
 def load_and_normalize_column_names(basic_level_path, modality):
     """
@@ -49,7 +74,10 @@ def load_and_normalize_column_names(basic_level_path, modality):
     """
     _check_modality(modality)
     df = (pd
-          .read_csv(basic_level_path)
+          .read_csv(basic_level_path,
+                    usecols=partial(_is_used_column, modality=modality),
+                    dtype=RAW_DTYPES_BY_MODALITY[modality],
+                    engine='c')
           .rename(columns=COLUMN_NAME_MAPPER[modality])
           [COLUMNS_BY_MODALITY[modality]]
           .assign(id=basic_level_path.name))
@@ -65,8 +93,12 @@ def load_and_normalize_column_names(basic_level_path, modality):
         # one coumn
         df['ordinal'] = df.ordinal.astype(pd.Int64Dtype())
 
-    # Some basic level data have trailing whitespace which additionally results in "NA " not being recognized as nan
-    df['basic_level'] = df.basic_level.str.strip().replace('NA', np.nan)
+    # Some basic level data have trailing whitespace which additionally results in "NA " not being recognized as nan.
+    # Basic levels repeat a lot within a file, so each distinct value is cleaned once and the result is mapped back
+    # onto the rows. Missing values get code -1 which isn't in the index of `cleaned` and so become NaN.
+    codes, distinct_values = pd.factorize(df.basic_level)
+    cleaned = pd.Series(distinct_values, dtype=object).str.strip().replace('NA', np.nan)
+    df['basic_level'] = cleaned.reindex(codes).to_numpy()
 
     return df
 
@@ -81,22 +113,27 @@ def gather_basic_level_annotations(modality):
     """
     _check_modality(modality)
     basic_level_paths = get_all_basic_level_paths(modality=modality)
-    return pd.concat([
-        load_and_normalize_column_names(basic_level_path, modality=modality)
-        for basic_level_path
-        in tqdm(basic_level_paths, desc=f'Gathering {modality} basic level annotations')])
+    # pandas releases the GIL while parsing csv files, so threads let reading and parsing of different files overlap.
+    # executor.map returns the dataframes in the same order as the paths.
+    load = partial(load_and_normalize_column_names, modality=modality)
+    with ThreadPoolExecutor(max_workers=min(32, len(basic_level_paths) or 1)) as executor:
+        return pd.concat(list(tqdm(executor.map(load, basic_level_paths), total=len(basic_level_paths),
+                                   desc=f'Gathering {modality} basic level annotations')))
 
 
 def _combine_basic_level_annotations(all_audio_df, all_video_df):
-    # Concatenate
-    all_df = pd.concat(objs=[all_video_df, all_audio_df],
-                       keys=['video', 'audio'],
-                       names=['audio_video', 'index']
-                       ).reset_index(0)
-
-    # Add extra columns
-    all_df[['subj', 'month']] = all_df.id.str.split('_', expand=True)[[0, 1]]
-    all_df['SubjectNumber'] = all_df.subj + '_' + all_df.month
+    # Concatenate. Tagging each dataframe with a scalar column is cheaper than building a MultiIndex with keys= and then
+    # moving its outer level to a column.
+    all_df = pd.concat(objs=[all_video_df.assign(audio_video='video'), all_audio_df.assign(audio_video='audio')],
+                       copy=False)
+
+    # Add extra columns. All rows from the same file have the same id (e.g., "01_06_audio_sparse_code.csv"), so each
+    # distinct id is split only once and the results are spread onto the rows by factorization codes.
+    codes, distinct_ids = pd.factorize(all_df.id)
+    subj_month = [id_.split('_', 2)[:2] for id_ in distinct_ids]
+    all_df['subj'] = np.array([subj for subj, _ in subj_month], dtype=object)[codes]
+    all_df['month'] = np.array([month for _, month in subj_month], dtype=object)[codes]
+    all_df['SubjectNumber'] = np.array([f'{subj}_{month}' for subj, month in subj_month], dtype=object)[codes]
 
     # Enforce column order
     all_df = all_df[COLUMNS_BY_MODALITY['combined']]
@@ -104,6 +141,35 @@ def _combine_basic_level_annotations(all_audio_df, all_video_df):
     return all_df
 
 
+def _sort_codes(column, ascending=True):
+    """
+    Converts a column to integer codes that sort the same way the values do, to be used with np.lexsort. Missing values
+    get the largest code so that they are sorted last regardless of the direction, same as in sort_values.
+    """
+    codes, distinct_values = pd.factorize(column, sort=True)
+    if not ascending:
+        codes = np.where(codes == -1, -1, len(distinct_values) - 1 - codes)
+    return np.where(codes == -1, len(distinct_values), codes)
+
+
+def _to_categoricals_by_key(df, key_column, dependent_columns):
+    """
+    Converts key_column and columns whose values are fully determined by it to categoricals, with the same result as
+    astype('category'). Only key_column is factorized over all rows, the dependent columns are factorized over one row
+    per distinct key.
+    :return: dict mapping column names to pd.Categorical objects
+    """
+    key_codes, _ = pd.factorize(df[key_column])
+    # Codes are assigned in the order of first appearance, so the first rows come out in the order of the codes
+    _, first_rows = np.unique(key_codes, return_index=True)
+
+    categoricals = dict()
+    for column in [key_column] + dependent_columns:
+        codes_by_key, categories = pd.factorize(df[column].to_numpy()[first_rows], sort=True)
+        categoricals[column] = pd.Categorical.from_codes(codes_by_key[key_codes], categories=categories)
+    return categoricals
+
+
 def gather_all_basic_level_annotations(keep_comments=False, keep_basic_level_na=False):
     """
 
@@ -122,23 +188,38 @@ def gather_all_basic_level_annotations(keep_comments=False, keep_basic_level_na=
     all_df = _combine_basic_level_annotations(all_audio_df=by_modality[AUDIO],
                                               all_video_df=by_modality[VIDEO])
 
-    # Remove comments
+    # Rows to keep are marked with a single mask so that the rows are filtered and sorted with one copy at the end.
+    keep = np.ones(len(all_df), dtype=bool)
+
+    # Remove comments. The prefix is checked once per distinct object value and then looked up by factorization codes.
     if not keep_comments:
-        all_df = all_df[~all_df.object.str.startswith('%com:')]
+        codes, distinct_objects = pd.factorize(all_df.object)
+        # Missing values get code -1 which will pick the appended False, i.e., they are not comments.
+        is_comment = np.append(pd.Index(distinct_objects).str.startswith('%com:'), False)
+        keep &= ~is_comment[codes]
 
     # Remove rows without the basic level information
     if not keep_basic_level_na:
-        all_df = all_df[~all_df.basic_level.isna()]
-
-    # Sort by modality, month and subject, and ordinal for consistency between versions.
-    all_df = all_df.sort_values(by=['audio_video', 'month', 'subj', 'ordinal'],
-                                ascending=[False, True, True, True])
-
-    # Convert a subset of the columns to factors (categorical in the pandas's terms)
+        keep &= all_df.basic_level.notna().to_numpy()
+
+    # Sort by modality, month and subject, and ordinal for consistency between versions. np.lexsort takes the primary key
+    # last and, like sort_values, is stable. Sort codes of the whole dataframe keep their order when some rows are
+    # dropped, so they can be computed before filtering.
+    kept_rows = np.flatnonzero(keep)
+    order = np.lexsort([_sort_codes(all_df.ordinal)[kept_rows],
+                        _sort_codes(all_df.subj)[kept_rows],
+                        _sort_codes(all_df.month)[kept_rows],
+                        _sort_codes(all_df.audio_video, ascending=False)[kept_rows]])
+    all_df = all_df.iloc[kept_rows[order]]
+
+    # Convert a subset of the columns to factors (categorical in the pandas's terms). subj, month, and SubjectNumber are
+    # determined by id, so only id is factorized over all rows for these four.
     factor_columns = ['object', 'utterance_type',
-                      'object_present', 'speaker', 'basic_level', 'id', 'subj',
-                      'month', 'SubjectNumber', 'audio_video', 'tier']
+                      'object_present', 'speaker', 'basic_level', 'audio_video', 'tier']
     all_df[factor_columns] = all_df[factor_columns].astype('category')
+    for column, categorical in _to_categoricals_by_key(all_df, key_column='id',
+                                                       dependent_columns=['subj', 'month', 'SubjectNumber']).items():
+        all_df[column] = categorical
 
     all_df.reset_index(drop=True, inplace=True)
 
@@ -157,18 +238,20 @@ def check_for_errors(all_basic_level_df: pd.DataFrame):
     """
     df = all_basic_level_df
 
-    # Find duplicate annotation ids
-    # keep=False - mark all duplicates as such
-    duplicates = df[df.duplicated(subset=['annotid'], keep=False)]
-
-    # Invalid codes
-    invalid_utterance_type = df[~df.utterance_type.isin(UTTERANCE_TYPE_CODES)]
-    invalid_object_present = df[~df.object_present.isin(OBJECT_PRESENT_CODES)]
-
-    all_errors = pd.concat(
-        objs=[duplicates, invalid_utterance_type, invalid_object_present],
-        keys=['duplicate annotation id', 'invalid utterance type code', 'invalid object present code'],
-        names=['error_type', 'index']).reset_index(0)
+    error_types = np.array(['duplicate annotation id', 'invalid utterance type code', 'invalid object present code'])
+    is_error = np.stack([
+        # Find duplicate annotation ids
+        # keep=False - mark all duplicates as such
+        df.duplicated(subset=['annotid'], keep=False).to_numpy(),
+        # Invalid codes
+        (~df.utterance_type.isin(UTTERANCE_TYPE_CODES)).to_numpy(),
+        (~df.object_present.isin(OBJECT_PRESENT_CODES)).to_numpy()])
+
+    # nonzero goes row by row through is_error, so the errors are grouped by type, in the order above. A row with
+    # several errors is listed once per error.
+    error_type_index, row_index = np.nonzero(is_error)
+    all_errors = df.iloc[row_index].reset_index(drop=True)
+    all_errors.insert(0, 'error_type', error_types[error_type_index])
 
     if len(all_errors.index) > 0:
         return all_errors
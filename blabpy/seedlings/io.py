@@ -4,10 +4,16 @@ This module provides constants and functions for reading both specific files (e.
  order of the keys is also used to set the order of the columns when creating these files.
 """
 
+import csv
+import functools
+import io
+import os
 import warnings
 from _csv import QUOTE_NONNUMERIC
 
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pa_csv
 
 from blabpy.seedlings import UTTERANCE_TYPE_CODES, OBJECT_PRESENT_CODES, SPEAKER_CODES, CHILDREN_STR, MONTHS_STR, \
     TIERS, MODALITIES
@@ -105,6 +111,13 @@ SEEDLINGS_NOUNS_RECORDINGS_DTYPES = {
     'surplus_ms': pd.Int64Dtype()}
 
 
+VIDEO_RECORDINGS_DTYPES = {
+    'subject_month': pd.StringDtype(),
+    'start': DATETIME_DTYPE_PLACEHOLDER,
+    'end': DATETIME_DTYPE_PLACEHOLDER,
+    'duration': pd.StringDtype()}
+
+
 SEEDLINGS_NOUNS_CODEBOOK_CORE_DTYPES = {
     'column': pd.StringDtype(),
     'data_type': pd.StringDtype(),
@@ -119,38 +132,123 @@ SEEDLINGS_NOUNS_SORT_BY = {
     'recordings.csv': ['recording_id']}
 
 
+# The same dtype objects as in the dictionaries above, so that comparing them is an identity check
+_SUBJECT_CHILD_MONTH_DTYPES = {
+    'subject': ALL_BASICLEVEL_DTYPES['subj'],
+    'child': ALL_BASICLEVEL_DTYPES['subj'],
+    'month': ALL_BASICLEVEL_DTYPES['month']}
+
+
 def _convert_subject_child_month(df):
     """subject/child, month should always be read as categorical variables with string values"""
-    for column in ('subject', 'child', 'month'):
-        if column in df.columns:
-            # Convert to formatted string values
-            df[column] = (df[column].astype(int).apply(lambda subj: f'{subj:02d}'))
+    for column, target_dtype in _SUBJECT_CHILD_MONTH_DTYPES.items():
+        # Columns read with this exact dtype already hold zero-padded strings
+        if column in df.columns and df[column].dtype != target_dtype:
+            # Convert to zero-padded string values, e.g., 6 -> "06"
+            df[column] = df[column].astype(int).astype(str).str.zfill(2)
             # Convert to categorical
-            if column in ('subject', 'child'):
-                df[column] = df[column].astype(pd.CategoricalDtype(categories=CHILDREN_STR))
-            elif column == 'month':
-                df[column] = df[column].astype(pd.CategoricalDtype(categories=MONTHS_STR))
+            df[column] = df[column].astype(target_dtype)
 
     return df
 
 
+# pandas treats "None" and "<NA>" as missing too, pyarrow doesn't by default
+_PYARROW_NULL_VALUES = pa_csv.ConvertOptions().null_values + ['None', '<NA>']
+
+
+_PYARROW_TO_PANDAS_TYPES = {
+    pa.string(): pd.StringDtype(),
+    pa.int64(): pd.Int64Dtype(),
+    pa.bool_(): pd.BooleanDtype()}
+
+
+def _read_csv_header(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return next(csv.reader(f), [])
+
+
+def _read_csv_with_pyarrow(path, dtype, parse_dates):
+    """
+    A faster version of pd.read_csv(path, dtype=dtype, parse_dates=parse_dates) that parses columns in parallel using
+    pyarrow.
+
+    Text and datetime column types are passed to pyarrow directly: when pyarrow is left to infer a column's type and
+    pandas converts it afterwards, text like month "06" is first parsed as the number 6 and then doesn't match any
+    category. Other columns are inferred by pyarrow and converted by pandas, so that, e.g., "10.0" can still be read
+    into an Int64 column.
+    """
+    column_types = {column: pa.string()
+                    for column, column_dtype in dtype.items()
+                    if isinstance(column_dtype, pd.StringDtype)}
+    # Categorical columns are dictionary-encoded while parsing. Converting them to pandas then only has to map the few
+    # distinct values onto the declared categories instead of looking up every row.
+    column_types.update({column: pa.dictionary(pa.int32(), pa.string())
+                         for column, column_dtype in dtype.items()
+                         if isinstance(column_dtype, pd.CategoricalDtype)})
+    column_types.update({column: pa.timestamp('ns') for column in parse_dates})
+
+    convert_options = pa_csv.ConvertOptions(column_types=column_types,
+                                            null_values=_PYARROW_NULL_VALUES,
+                                            strings_can_be_null=True)
+    # Strings, integers and booleans go straight into nullable pandas columns, so the string columns don't have to be
+    # materialized as Python objects first and integer columns with missing values don't detour through float64.
+    df = pa_csv.read_csv(path, convert_options=convert_options).to_pandas(types_mapper=_PYARROW_TO_PANDAS_TYPES.get)
+    return df.astype({column: column_dtype for column, column_dtype in dtype.items()
+                      if column in df.columns and df[column].dtype != column_dtype})
+
+
+@functools.lru_cache(maxsize=16)
+def _read_csv_with_pyarrow_cached(path, file_version, dtype_items, parse_dates):
+    """
+    Cached _read_csv_with_pyarrow. All arguments have to be hashable.
+    :param path: absolute path to the csv file
+    :param file_version: a tuple that changes whenever the file does, e.g., (modification time, size)
+    :param dtype_items: tuple of (column, dtype) pairs
+    :param parse_dates: tuple of datetime columns
+    """
+    return _read_csv_with_pyarrow(path, dtype=dict(dtype_items), parse_dates=list(parse_dates))
+
+
 def blab_read_csv(path, **kwargs):
     # Pandas doesn't allow for a custom dtype for datetime columns, the columns have to be passed to read_csv as
-    # parse_dates.
-    dtypes = kwargs.get('dtype', {})
+    # parse_dates. The dictionary is copied so that the caller's one, often a module constant, isn't modified.
+    dtypes = dict(kwargs.get('dtype', {}))
     date_columns = [column
                     for column in dtypes
                     if dtypes[column] == DATETIME_DTYPE_PLACEHOLDER]
     for column in date_columns:
         del dtypes[column]
+    if 'dtype' in kwargs:
+        kwargs['dtype'] = dtypes
     if date_columns:
         assert 'parse_dates' not in kwargs, 'Can\'t have datetime columns in dtype and parse_dates at the same time'
         kwargs['parse_dates'] = date_columns
 
-    df = pd.read_csv(path, **kwargs).convert_dtypes()
-
-    # Nudge towards specifying all columns
-    unspecified_columns = set(df.columns) - set(dtypes.keys()) - set(date_columns)
+    # pyarrow is used only when the type of every column is known: it would infer types of the rest differently from
+    # pandas, e.g., parse dates in columns that pandas would leave as strings.
+    if set(kwargs) <= {'dtype', 'parse_dates'} and set(_read_csv_header(path)) <= set(dtypes) | set(date_columns):
+        # The same files tend to be read many times in one session, so parsed tables are cached. The cache is keyed
+        # by the file's modification time and size, so an edited file is read again. The cached table is copied
+        # because the caller and the code below may modify it.
+        stat = os.stat(path)
+        df = _read_csv_with_pyarrow_cached(os.path.realpath(path), (stat.st_mtime_ns, stat.st_size),
+                                           tuple(dtypes.items()), tuple(date_columns)).copy()
+    else:
+        # With low_memory=False, pandas infers the type of each column from the whole column instead of chunk by chunk,
+        # so a column doesn't end up with a mix of types that convert_dtypes below would have to sort out.
+        df = pd.read_csv(path, **{'low_memory': False, **kwargs})
+
+    # Columns that already have nullable (extension) dtypes, which is all the columns when the caller specified pandas
+    # dtypes for each of them, would be left as is by convert_dtypes anyway, so only the rest are inferred. Same for
+    # the datetime columns, so when every column is specified, convert_dtypes isn't called at all.
+    columns_to_convert = [column for column, column_dtype in df.dtypes.items()
+                          if not isinstance(column_dtype, pd.api.extensions.ExtensionDtype)
+                          and column not in date_columns]
+    if columns_to_convert:
+        df[columns_to_convert] = df[columns_to_convert].convert_dtypes()
+
+    # Nudge towards specifying all columns. Unlike a set difference, the list keeps the columns in the file order.
+    unspecified_columns = [column for column in df.columns if column not in dtypes and column not in date_columns]
     if unspecified_columns:
         warnings.warn(f'Data types of column(s) {", ".join(unspecified_columns)} were not specified.')
 
@@ -208,11 +306,7 @@ def read_seedlings_codebook(path):
 def read_video_recordings_csv(path=None):
     if path is None:
         path = get_video_recordings_csv_path()
-    video_recordings_dtypes = dict(subject_month=pd.StringDtype(),
-                                   start=DATETIME_DTYPE_PLACEHOLDER,
-                                   end=DATETIME_DTYPE_PLACEHOLDER,
-                                   duration=pd.StringDtype())
-    df = blab_read_csv(path, dtype=video_recordings_dtypes)
+    df = blab_read_csv(path, dtype=VIDEO_RECORDINGS_DTYPES)
     df['duration'] = pd.to_timedelta(df['duration'])
 
     return df
@@ -222,34 +316,57 @@ def _timedelta_to_hhmmss(timedeltas: pd.Series) -> pd.Series:
     """Convert a timedelta to a string in the format HH:MM:SS"""
 
     total_seconds = timedeltas.dt.total_seconds().round().astype(int)
-    components = pd.DataFrame.from_dict(dict(
-            hours=total_seconds // 3600,
-            minutes=(total_seconds % 3600) // 60,
-            seconds=total_seconds % 60))
+    hours, minutes, seconds = (component.astype(str).str.zfill(2)
+                               for component in (total_seconds // 3600,
+                                                 (total_seconds % 3600) // 60,
+                                                 total_seconds % 60))
 
-    return (components
-            .apply(lambda x: x.astype(str).str.zfill(2), axis='rows')
-            .pipe(lambda x: x.hours + ':' + x.minutes + ':' + x.seconds))
+    return (hours + ':' + minutes + ':' + seconds).rename(None)
 
 
 def write_video_recordings_csv(df, path=None):
     """Writing companion for read_video_recordings_csv"""
     if df.duration.dtype == 'timedelta64[ns]':
-        df = df.copy().assign(duration=_timedelta_to_hhmmss(df.duration))
+        df = df.assign(duration=_timedelta_to_hhmmss(df.duration))
     blab_write_csv(df, path, index=False)
 
 
-def write_all_basic_level_to_csv(all_basic_level_df, csv_path):
+def write_all_basic_level_to_csv(all_basic_level_df, csv_path, engine='pandas'):
     """
     Write the output of gather_all_basic_level_annotations to a csv file in a way consistent with the older R code.
     The result is still not fully consistent but it is close enough.
     (readr::write_csv writes number 10000 as 1e+5 which was too silly to emulate)
     :param all_basic_level_df: a pandas DataFrame
     :param csv_path: a path to the csv or None if you want to return the string that would have been written
-    :return:
+    :param engine: 'pandas' (default) or 'pyarrow'. The pyarrow writer is much faster on large tables and quotes the
+    same way but writes missing values as empty fields instead of NA. Both readr::read_csv and pandas.read_csv read
+    those back as missing values.
+    :return: the csv string if csv_path is None, None otherwise
     """
+    if engine == 'pyarrow':
+        return _write_csv_with_pyarrow(all_basic_level_df, csv_path)
+    elif engine != 'pandas':
+        raise ValueError(f'engine must be either "pandas" or "pyarrow", got "{engine}"')
+
     # For consistency with readr::write_csv that quotes strings but does not quote NAs, we'll have to use the following
     # trick from https://www.reddit.com/r/Python/comments/mu65ms/quoting_of_npnan_with_csvquote_nonnumeric_in/
     # This way, NAs will be considered numeric and won't be quoted.
     na = type("NaN", (float,), dict(__str__=lambda _: "NA"))()
     return all_basic_level_df.to_csv(csv_path, index=False, quoting=QUOTE_NONNUMERIC, na_rep=na)
+
+
+def _write_csv_with_pyarrow(df, csv_path):
+    """
+    Writes df the way write_all_basic_level_to_csv does, using pyarrow's C++ csv writer. With quoting_style='needed',
+    the header and string values are quoted while numbers and nulls are not - same as QUOTE_NONNUMERIC with the NaN
+    trick, except that nulls are written as empty fields.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    write_options = pa_csv.WriteOptions(quoting_style='needed')
+    if csv_path is not None:
+        pa_csv.write_csv(table, str(csv_path), write_options=write_options)
+        return None
+
+    buffer = io.BytesIO()
+    pa_csv.write_csv(table, buffer, write_options=write_options)
+    return buffer.getvalue().decode('utf-8')
@@ -3,9 +3,12 @@ Functions in this module check how much time in each audio recording has been li
 
 The main worker function is listen_time_stats_for_report. It also calls
 """
+from collections import Counter
 from enum import Enum
 import re
+from types import SimpleNamespace
 
+import numpy as np
 import pandas as pd
 
 # Our default rule says that a subregion has been listened to if it has at least one annotation. However, several
@@ -38,6 +41,23 @@ ANNOTATION_REGEX = re.compile(
     r'([a-zA-Z][a-z+]*)( +)(&=)([A-Za-z]{1})(_)([A-Za-z]{1})(_)([A-Z]{1}[A-Z0-9]{2})(_)?(0x[a-z0-9]{6})?',
     re.IGNORECASE | re.DOTALL)
 TIMESTAMP_REGEX = re.compile("\\x15(\d+)_(\d+)\\x15")
+# Matches either an annotation or a timestamp so that both can be found in a single pass over the text. Neither of the
+# two can start within a match of the other.
+ANNOTATION_OR_TIMESTAMP_REGEX = re.compile(
+    f'(?P<annotation>{ANNOTATION_REGEX.pattern})|\\x15(?P<onset>\\d+)_(?P<offset>\\d+)\\x15',
+    re.IGNORECASE | re.DOTALL)
+
+# This regex will consume any number of lines the first of which starts with '%com' or '%xcom' and the last of which is
+# followed by a line that starts with any character except for the tabulation symbol. This is necessary to consume the
+# multiline comments which use `\t` as the line continuation symbol. For this regex to work, we need to additionally
+# specify the MULTILINE (we want '^' to match the beginning of any line, not just of the whole text) and the DOTALL (we
+# want '.*' to be able to cross the line boundaries) flags.
+COMMENT_LINE_REGEX = re.compile(r'^%x?com:.*?(?=^[^\t])', re.MULTILINE | re.DOTALL)
+
+# Parts of the subregion boundary comments
+SUBREGION_POSITION_REGEX = re.compile(r'subregion (\d+) of (\d+)')
+SUBREGION_RANK_REGEX = re.compile(r'ranked (\d+) of (\d+)')
+SUBREGION_TIME_REGEX = re.compile(r'at (\d+)')
 
 
 def _region_boundaries_to_dataframe(region_lines):
@@ -46,23 +66,25 @@ def _region_boundaries_to_dataframe(region_lines):
     :param region_lines: a list of string read from the first part of a cha structure file
     :return: a pandas dataframe
     """
-    boundaries_df = pd.DataFrame(columns=('region_type', 'which_boundary', 'time'),
-                                 # Each line is "<region_type> <starts|ends> <timestamp>"
-                                 data=[line.split() for line in region_lines])
-
-    assert boundaries_df.region_type.isin(REGION_TYPES).all()
+    # Each line is "<region_type> <starts|ends> <timestamp>". For each type, number all starts 1, 2, 3 and all ends 1, 2,
+    # 3 so that we can then match starts to ends. This is done in a single pass over the lines.
+    boundary_counts = Counter()
+    boundaries = dict(starts=dict(), ends=dict())  # which_boundary -> {(region_type, position): time}
+    for line in region_lines:
+        region_type, which_boundary, time = line.split()
+        assert region_type in REGION_TYPES
+        boundary_counts[region_type, which_boundary] += 1
+        boundaries[which_boundary][region_type, boundary_counts[region_type, which_boundary]] = int(time)
 
-    # For each type, count all starts 1, 2, 3 and count all ends 1, 2, 3 so that we can then match starts to ends.
-    boundaries_df['position'] = boundaries_df.groupby(['region_type', 'which_boundary']).cumcount() + 1
     # Match starts to ends and combine
-    starts = boundaries_df[boundaries_df.which_boundary == 'starts'].drop(columns='which_boundary')
-    ends = boundaries_df[boundaries_df.which_boundary == 'ends'].drop(columns='which_boundary')
-    regions = pd.merge(left=starts, right=ends, how='left', on=['region_type', 'position'])
-    assert starts.shape[0] == ends.shape[0] == regions.shape[0]
-
-    # Rename and reorder columns
-    regions = regions.rename(columns=dict(time_x='start', time_y='end'))[['region_type', 'start', 'end', 'position']]
-    regions[['start', 'end']] = regions[['start', 'end']].astype(int)
+    starts, ends = boundaries['starts'], boundaries['ends']
+    assert starts.keys() == ends.keys()
+    regions = pd.DataFrame(columns=['region_type', 'start', 'end', 'position'],
+                           data=[(region_type, start, ends[region_type, position], position)
+                                 for (region_type, position), start in starts.items()])
+    # Without any regions, the columns would have the object dtype. int64 and not int because the latter is 32-bit on
+    # Windows and the interval arithmetic downstream works with int64 arrays.
+    regions = regions.astype(dict(start=np.int64, end=np.int64, position=np.int64))
 
     # Remove regions that have zero duration
     regions = regions[regions.start != regions.end]
@@ -81,10 +103,11 @@ def _subregion_ranks_to_dataframe(subregion_rank_lines, subregion_count=DEFAULT_
     :param subregion_count: for known recordings with four subregions
     :return:
     """
-    # Each row looks like "Position: 1, Rank: 1", so we can just extract position and rank using a regular expression
-    subregion_ranks = (pd.Series(subregion_rank_lines)
-                       .str.extractall(r'Position: (?P<position>\d+), Rank: (?P<subregion_rank>\d+)')
-                       .reset_index(drop=True))
+    # Each row looks like "Position: 1, Rank: 1", so we can just split it into parts. There are only a few lines, so
+    # doing it in pure Python is much faster than with pandas' string methods.
+    subregion_ranks = pd.DataFrame(
+        columns=['position', 'subregion_rank'],
+        data=[[part.split(': ')[1] for part in line.split(', ')] for line in subregion_rank_lines])
 
     # There should always be exactly five subregions and five ranks: 1 to 5
     positions = sorted(subregion_ranks.position.tolist())
@@ -121,6 +144,84 @@ def _set_difference_of_intervals(minuend, subtrahend):
     return result
 
 
+def _union_of_intervals(starts, ends):
+    """
+    Merges intervals into a union of disjoint intervals. Overlapping and back-to-back intervals are merged.
+    :param starts: numpy array of interval starts
+    :param ends: numpy array of interval ends
+    :return: (starts, ends) numpy arrays of the merged intervals in ascending order
+    """
+    if starts.size == 0:
+        return starts, ends
+
+    order = np.argsort(starts, kind='stable')
+    starts, ends = starts[order], ends[order]
+    # A new merged interval begins wherever an interval starts after all the previous ones have ended
+    is_first = np.concatenate([[True], starts[1:] > np.maximum.accumulate(ends)[:-1]])
+    first_indices = np.flatnonzero(is_first)
+    return starts[first_indices], np.maximum.reduceat(ends, first_indices)
+
+
+def _subtract_intervals(starts, ends, removed_starts, removed_ends):
+    """
+    Subtracts a number of closed intervals from each of a number of open intervals. The result is the same as if
+    _set_difference_of_intervals was applied with each of the removed intervals in turn, but all of them are processed
+    at once with numpy.
+    :param starts: int64 numpy array of starts of the intervals to be subtracted from
+    :param ends: int64 numpy array of their ends
+    :param removed_starts: int64 numpy array of starts of the intervals to be subtracted
+    :param removed_ends: int64 numpy array of their ends
+    :return: (indices, starts, ends) numpy arrays with one element per each resulting interval. Indices point to the
+    original intervals, parts of the same interval are adjacent and ordered by start.
+    """
+    union_starts, union_ends = _union_of_intervals(removed_starts, removed_ends)
+
+    # What is left from each interval is its intersections with the gaps between the merged removed intervals. The
+    # first and the last gap are unbounded on one side.
+    int64_info = np.iinfo(np.int64)
+    gap_starts = np.concatenate([[int64_info.min], union_ends])
+    gap_ends = np.concatenate([union_starts, [int64_info.max]])
+
+    # Both gap_starts and gap_ends are sorted, so the gaps intersecting each interval are a contiguous range.
+    first_gaps = np.searchsorted(gap_ends, starts, side='right')
+    gap_counts = np.maximum(np.searchsorted(gap_starts, ends, side='left') - first_gaps, 0)
+
+    # One row per (interval, gap) pair
+    indices = np.repeat(np.arange(starts.size), gap_counts)
+    offsets_within_interval = np.arange(indices.size) - np.repeat(np.cumsum(gap_counts) - gap_counts, gap_counts)
+    gap_indices = np.repeat(first_gaps, gap_counts) + offsets_within_interval
+    new_starts = np.maximum(starts[indices], gap_starts[gap_indices])
+    new_ends = np.minimum(ends[indices], gap_ends[gap_indices])
+
+    is_nonempty = new_starts < new_ends
+    return indices[is_nonempty], new_starts[is_nonempty], new_ends[is_nonempty]
+
+
+def _remove_intervals_from_regions(regions, starts, ends):
+    """
+    Removes a number of time intervals from each region in regions. See _remove_interval_from_regions for details.
+    :param regions: a regions dataframe (region_type, start, end columns)
+    :param starts: sequence of numbers, starts of the intervals to be removed
+    :param ends: sequence of numbers, ends of the intervals to be removed
+    :return: a new dataframe with one row per each resulting region part or None, if all regions get removed
+    """
+    region_starts, region_ends = regions.start.to_numpy(dtype=np.int64), regions.end.to_numpy(dtype=np.int64)
+    removed_starts, removed_ends = np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
+    assert (region_starts < region_ends).all() and (removed_starts < removed_ends).all()
+
+    region_indices, new_starts, new_ends = _subtract_intervals(region_starts, region_ends, removed_starts, removed_ends)
+
+    # If no regions are left after the removal, return None
+    if region_indices.size == 0:
+        return
+
+    with_intervals_removed = regions.iloc[region_indices].reset_index(drop=True)
+    with_intervals_removed['start'] = new_starts
+    with_intervals_removed['end'] = new_ends
+
+    return with_intervals_removed
+
+
 def _remove_interval_from_regions(regions, start, end):
     """
     Removes a time interval from each region in regions. As a results, each region can:
@@ -133,31 +234,45 @@ def _remove_interval_from_regions(regions, start, end):
     :return: a new dataframe with one row per each resulting region part or None, if all regions get removed
     """
     assert_numbers(start, end)
-    with_interval_removed = regions.copy()
+    return _remove_intervals_from_regions(regions, [start], [end])
 
-    # For each region, get a list of starts and ends of its subregions after the removal
-    new_starts_and_ends = 'new_starts_and_ends'
-    with_interval_removed[new_starts_and_ends] = with_interval_removed.apply(
-        lambda row: _set_difference_of_intervals(minuend=(int(row.start), int(row.end)), subtrahend=(start, end)),
-        axis='columns')
 
-    # Now, each element in that list should get its own row.
-    with_interval_removed = (with_interval_removed
-                             .explode(new_starts_and_ends)
-                             .dropna(subset=[new_starts_and_ends])  # Empty lists result in an NA row
-                             .drop(columns=['start', 'end'])  # The original start and end can be dropped now
-                             )
+def _remove_overlaps_in_order(regions, dominant_region_types):
+    """
+    Same as calling _remove_overlaps_from_other_regions with each of the dominant region types in turn. In between the
+    steps, the regions are kept as numpy arrays of boundaries and row numbers, so the dataframe is only built once.
+    :param regions: a dataframe with at least region_type, start, and end columns
+    :param dominant_region_types: list of region types (strings), overlaps with which will be removed from other
+    regions, in this order
+    :return: copy of the regions dataframe with some of the regions modified
+    """
+    type_codes, region_types = pd.factorize(regions.region_type)
+    row_numbers = np.arange(len(regions))
+    starts, ends = regions.start.to_numpy(dtype=np.int64), regions.end.to_numpy(dtype=np.int64)
+    assert (starts < ends).all()
 
-    # If no regions are left after the removal, return None
-    if with_interval_removed.size == 0:
-        return
+    for dominant_region_type in dominant_region_types:
+        # Missing region types have code -1 which will pick the appended False
+        is_dominant = np.append(region_types == dominant_region_type, False)[type_codes[row_numbers]]
+
+        # If there are no "other" regions, there is nothing to do. This only happens for recordings from months 6 and 7
+        # that only have skips or only have silences.
+        if is_dominant.all() or not is_dominant.any():
+            continue
+
+        dominant, nondominant = np.flatnonzero(is_dominant), np.flatnonzero(~is_dominant)
+        part_indices, part_starts, part_ends = _subtract_intervals(starts[nondominant], ends[nondominant],
+                                                                   starts[dominant], ends[dominant])
+        # Dominant regions go first, followed by whatever is left of the other ones
+        row_numbers = np.concatenate([row_numbers[dominant], row_numbers[nondominant][part_indices]])
+        starts = np.concatenate([starts[dominant], part_starts])
+        ends = np.concatenate([ends[dominant], part_ends])
 
-    # Split 'new_start_and_ends' column that contains (start, end) tuples into two columns - start and end.
-    with_interval_removed[['start', 'end']] = with_interval_removed.new_starts_and_ends.values.tolist()
-    with_interval_removed.drop(columns=[new_starts_and_ends], inplace=True)
+    with_overlaps_removed = regions.iloc[row_numbers].reset_index(drop=True)
+    with_overlaps_removed['start'] = starts
+    with_overlaps_removed['end'] = ends
 
-    # Finally, restore the original column order, reset index, and return
-    return with_interval_removed[regions.columns].reset_index(drop=True)
+    return with_overlaps_removed.astype(dict(start=regions.start.dtype, end=regions.end.dtype))
 
 
 def _remove_overlaps_from_other_regions(regions, dominant_region_type):
@@ -168,21 +283,7 @@ def _remove_overlaps_from_other_regions(regions, dominant_region_type):
     :param dominant_region_type: the region type overlaps with which will be removed from other regions.
     :return: copy of the regions dataframe with some of the non-dominant regions modified
     """
-    is_dominant = regions.region_type == dominant_region_type
-
-    # If there are no "other" regions, there is nothing to do. This only happens for recordings from months 6 and 7 that
-    # only have skips or only have silences.
-    if is_dominant.all():
-        return regions
-
-    dominant, nondominant = regions[is_dominant], regions[~is_dominant]
-    for row in dominant.itertuples():
-        nondominant = _remove_interval_from_regions(nondominant, int(row.start), int(row.end))
-        if nondominant is None:
-            break
-
-    # Combine with the dominant regions and return
-    return pd.concat([dominant, nondominant]).reset_index(drop=True)
+    return _remove_overlaps_in_order(regions, [dominant_region_type])
 
 
 def _remove_silences_and_skips(regions):
@@ -193,10 +294,7 @@ def _remove_silences_and_skips(regions):
     :return: a dataframe with skips and silence removed as regions and the corresponding interval removed from other
     regions
     """
-    for region_type in (RegionType.SILENCE.value, RegionType.SKIP.value):
-        regions = _remove_overlaps_from_other_regions(regions=regions, dominant_region_type=region_type)
-
-    return regions
+    return _remove_overlaps_in_order(regions, [RegionType.SILENCE.value, RegionType.SKIP.value])
 
 
 def _overlaps_with_interval(regions, start, end):
@@ -229,25 +327,27 @@ def _remove_subregions(regions, condition_function, other_region_types):
     Remove all subregions that satisfy a given condition depending on overlap with another region, e.g., have at least
     some overlap with silences or skips.
     :param regions: a full regions dataframe
-    :param condition_function: a function that takes in regions, start, and end and returns a boolean Series that tells
-    us whether each region in regions satisfies a given condition (e.g., partially overlaps, fully nested in, etc.)
+    :param condition_function: a function that takes in regions, start, and end and returns a boolean Series/array that
+    tells us whether each region in regions satisfies a given condition (e.g., partially overlaps, fully nested in,
+    etc.). It must only use comparisons and logical operators so that it works with broadcast numpy arrays too.
     :param other_region_types: which regions should be tested against the condition? A list of RegionType properties.
     :return:
     """
     # Get necessary subsets of regions
-    is_subregion = regions.region_type == RegionType.SUBREGION.value
-    subregions, not_subregions = regions[is_subregion], regions[~is_subregion]
+    is_subregion = (regions.region_type == RegionType.SUBREGION.value).to_numpy()
     # Convert other_region_types to a list of string to test against
     other_region_types_str = [other_region_type.value for other_region_type in other_region_types]
-    other_regions = regions[regions.region_type.isin(other_region_types_str)]
+    is_other = regions.region_type.isin(other_region_types_str).to_numpy()
+    starts, ends = regions.start.to_numpy(dtype=np.int64), regions.end.to_numpy(dtype=np.int64)
 
-    # Do the removal
-    for other_region in other_regions.itertuples():
-        condition_satisfied = condition_function(subregions, other_region.start, other_region.end)
-        subregions = subregions[~condition_satisfied]
+    # Do the removal. All pairs are tested at once: subregions go along the rows and other regions along the columns.
+    subregion_boundaries = SimpleNamespace(start=starts[is_subregion, np.newaxis], end=ends[is_subregion, np.newaxis])
+    condition_satisfied = condition_function(subregion_boundaries,
+                                             starts[np.newaxis, is_other], ends[np.newaxis, is_other])
+    should_be_removed = np.zeros(len(regions), dtype=bool)
+    should_be_removed[is_subregion] = condition_satisfied.any(axis=1)
 
-    # Combine with the other regions, restore order, return
-    return pd.concat([subregions, not_subregions]).sort_index().reset_index(drop=True)
+    return regions[~should_be_removed].reset_index(drop=True)
 
 
 def _assign_makeup_and_extra_to_subregions(regions):
@@ -286,9 +386,8 @@ def _account_for_region_overlaps(regions):
     _assert_no_overlaps(regions[regions.region_type.isin(
         [RegionType.SURPLUS.value, RegionType.MAKEUP.value, RegionType.EXTRA.value])])
 
-    for dominant_region_type in dominant_region_types:
-        regions = _remove_overlaps_from_other_regions(regions, dominant_region_type.value)
-    return regions
+    return _remove_overlaps_in_order(regions, [dominant_region_type.value
+                                               for dominant_region_type in dominant_region_types])
 
 
 def _remove_subregions_without_annotations(regions_df, listened_but_empty):
@@ -303,10 +402,12 @@ def _remove_subregions_without_annotations(regions_df, listened_but_empty):
     # Check that no subregions have been split yet. Split subregions would result in duplicate position values.
     assert regions_df[regions_df.region_type == RegionType.SUBREGION.value].duplicated(subset=['position']).sum() == 0
 
-    # Which regions contain a "listened but empty" comment?
-    has_listened_but_empty_comment = regions_df.apply(
-        lambda row: any(row.start <= timestamp <= row.end for timestamp in listened_but_empty),
-        axis='columns')
+    # Which regions contain a "listened but empty" comment? Same binary search as in _add_per_region_timestamp_count
+    # but both boundaries are inclusive here.
+    comment_timestamps = np.sort(np.asarray(listened_but_empty, dtype=np.int64))
+    first_inside = np.searchsorted(comment_timestamps, regions_df.start.to_numpy(), side='left')
+    first_after = np.searchsorted(comment_timestamps, regions_df.end.to_numpy(), side='right')
+    has_listened_but_empty_comment = first_after > first_inside
 
     # Remove subregions without annotations unless they have a special comment
     is_subregion = regions_df.region_type == RegionType.SUBREGION.value
@@ -337,9 +438,8 @@ def _total_eligible_time(regions):
     """
     _assert_no_overlaps(regions)
     region_types_to_exclude = [RegionType.SURPLUS.value, RegionType.SILENCE.value, RegionType.SKIP.value]
-    total_time_per_region = _total_time_and_count_per_region_type(regions_df=regions[
-        ~regions.region_type.isin(region_types_to_exclude)])
-    return total_time_per_region.total_time.sum()
+    is_eligible = ~regions.region_type.isin(region_types_to_exclude).to_numpy()
+    return (regions.end.to_numpy(dtype=np.int64) - regions.start.to_numpy(dtype=np.int64))[is_eligible].sum()
 
 
 def _process_regions(regions, annotation_timestamps, listened_but_empty):
@@ -367,11 +467,22 @@ def _total_time_and_count_per_region_type(regions_df):
     :param regions_df: a regions dataframe with columns region_type, start, end, and position
     :return:
     """
-    return (regions_df
-            .assign(duration=(lambda df: df.end - df.start))
-            .groupby('region_type')
-            .aggregate(total_time=('duration', 'sum'),
-                       region_count=('position', 'nunique')))
+    # Same as grouping by region type and aggregating but with numpy on the group numbers. Regions without a type are
+    # dropped, like they would be by groupby.
+    type_codes, region_types = pd.factorize(regions_df.region_type, sort=True)
+    has_type = type_codes >= 0
+    type_codes = type_codes[has_type]
+    durations = (regions_df.end - regions_df.start).to_numpy()[has_type]
+    positions = regions_df.position.to_numpy()[has_type]
+
+    # Summing with bincount gives floats which are exact for any realistic number of milliseconds
+    total_time = np.bincount(type_codes, weights=durations, minlength=region_types.size).astype(durations.dtype)
+    # Split regions have the same position, so they are only counted once
+    unique_type_codes, _ = np.unique(np.column_stack([type_codes, positions]), axis=0).T
+    region_count = np.bincount(unique_type_codes, minlength=region_types.size)
+
+    return pd.DataFrame(index=pd.Index(region_types, name='region_type'),
+                        data=dict(total_time=total_time, region_count=region_count))
 
 
 def _extract_timestamps(clan_file_text: str):
@@ -407,9 +518,9 @@ def _match_with_timestamps(positions_in_text, timestamps_df, above=None, below=N
     :return: a copy of df_with_position_in_text with two additional columns: onset and offset
     """
     if below and not above:
-        direction = 'forward'
+        side = 'left'
     elif above and not below:
-        direction = 'backward'
+        side = 'right'
     else:
         raise ValueError('Exactly one of `above` and `below` arguments must evaluate to True')
 
@@ -421,8 +532,21 @@ def _match_with_timestamps(positions_in_text, timestamps_df, above=None, below=N
         assert positions_in_text.position_in_text.is_monotonic_increasing
     assert timestamps_df.position_in_text.is_monotonic_increasing
 
-    return pd.merge_asof(positions_in_text, timestamps_df,
-                         on='position_in_text', direction=direction)
+    # Same as pd.merge_asof on position_in_text. For each position, find the index of the first timestamp below it, the
+    # one above is right before that. Positions without a timestamp above/below get an index of a non-existent row, so
+    # reindex fills them with NaNs.
+    positions_df = pd.DataFrame(positions_in_text).reset_index(drop=True)
+    timestamp_indices = np.searchsorted(timestamps_df.position_in_text.to_numpy(),
+                                        positions_df.position_in_text.to_numpy(), side=side)
+    if above:
+        timestamp_indices -= 1
+    matched_timestamps = (timestamps_df
+                          .drop(columns='position_in_text')
+                          .reset_index(drop=True)
+                          .reindex(timestamp_indices)
+                          .reset_index(drop=True))
+
+    return pd.concat([positions_df, matched_timestamps], axis='columns')
 
 
 def _extract_annotation_timestamps(clan_file_text: str):
@@ -431,14 +555,22 @@ def _extract_annotation_timestamps(clan_file_text: str):
     :param clan_file_text: string with the clan file text
     :return: a pandas dataframe with two columns: 'onset' and 'offset'; and one row per each annotation found
     """
-    annotation_positions_in_text = pd.Series([match.start() for match in ANNOTATION_REGEX.finditer(clan_file_text)],
-                                             name='position_in_text')
+    # For each annotation, remember the index of the first timestamp below it. Annotations after the last timestamp get
+    # the index one past the end.
+    timestamps = []
+    next_timestamp_indices = []
+    for match in ANNOTATION_OR_TIMESTAMP_REGEX.finditer(clan_file_text):
+        if match.group('annotation') is None:
+            timestamps.append((int(match.group('onset')), int(match.group('offset'))))
+        else:
+            next_timestamp_indices.append(len(timestamps))
+
+    timestamps_df = pd.DataFrame(columns=['onset', 'offset'], data=timestamps)
+    if not timestamps_df.onset.is_monotonic_increasing:
+        raise ValueError('Timestamps are not in the right order.')
 
-    # Add the first timestamps below the annotations in the file
-    annotation_timestamps = _match_with_timestamps(
-        positions_in_text=annotation_positions_in_text,
-        timestamps_df=_extract_timestamps(clan_file_text),
-        below=True)
+    # Add the first timestamps below the annotations in the file. Annotations without one get NaNs.
+    annotation_timestamps = timestamps_df.reindex(next_timestamp_indices)
 
     # Here, we are only interested in unique timestamps, not unique annotations, so we should remove the duplicates
     annotation_timestamps = (annotation_timestamps
@@ -456,23 +588,11 @@ def _add_per_region_timestamp_count(regions_df, timestamps):
     :param timestamps: a dataframe with 'onset' column
     :return: regions_df with an additional column 'annotation_count'
     """
-    regions_df_columns = regions_df.columns.tolist()
-    # Brute-force solution: take a cross-product of regions and annotations and filter out rows where annotation is not
-    # within region boundaries
-    with_annotation_counts = (
-        regions_df
-        # There is no cross join in pandas AFAIK, so we'll have to join on a dummy constant column
-        .assign(cross_join=0)
-        .merge(timestamps.assign(cross_join=0), on='cross_join')
-        # The onset should within region boundaries
-        .query('start <= onset and onset < end')
-        .groupby(regions_df_columns)
-        .size()
-        .rename('annotation_count')
-        .reset_index()
-        # Above, we lost regions that do not have any annotations in them, let's put them back with the count of 0
-        .merge(regions_df, on=regions_df_columns, how='right')
-        .fillna(dict(annotation_count=0)))
+    # With sorted onsets, the annotations within a region are a contiguous range that can be found by binary search
+    onsets = np.sort(timestamps.onset.dropna().to_numpy())
+    first_inside = np.searchsorted(onsets, regions_df.start.to_numpy(), side='left')
+    first_after = np.searchsorted(onsets, regions_df.end.to_numpy(), side='left')
+    with_annotation_counts = regions_df.assign(annotation_count=np.maximum(first_after - first_inside, 0))
 
     return with_annotation_counts
 
@@ -487,40 +607,34 @@ def _extract_subregion_info(comment):
     :param comment: a string from the subregion boundary comment in a cha file
     :return: position, rank, offset
     """
-    subregion_position_regex = re.compile(r'subregion (\d+) of (\d+)')
-    subregion_rank_regex = re.compile(r'ranked (\d+) of (\d+)')
-    subregion_time_regex = re.compile(r'at (\d+)')
-    position = subregion_position_regex.search(comment).group(1)
-    rank = subregion_rank_regex.search(comment).group(1)
-    offset = int(subregion_time_regex.findall(comment)[0])
+    position = SUBREGION_POSITION_REGEX.search(comment).group(1)
+    rank = SUBREGION_RANK_REGEX.search(comment).group(1)
+    offset = int(SUBREGION_TIME_REGEX.findall(comment)[0])
 
     return position, rank, offset
 
 
-def _extract_region_info(clan_file_text: str, subregion_count=DEFAULT_SUBREGION_COUNT):
+def _extract_region_info(clan_file_text: str, subregion_count=DEFAULT_SUBREGION_COUNT, timestamps=None):
     """
     Extracts region boundaries, subregions ranks, and info about "listened to, nothing to annotate" from a clan file.
     :param clan_file_text: string with the clan file text
+    :param timestamps: output of _extract_timestamps for the same text if the caller already has it
     :return:
     """
-    # Find all the comments except for the LENA comments
+    if timestamps is None:
+        timestamps = _extract_timestamps(clan_file_text)
 
-    # This regex will consume any number of lines the first of which starts with '%com' or '%xcom' and the last of which
-    # is followed by a line that starts with any character except for the tabulation symbol. This is necessary to
-    # consume the multiline comments which use `\t` as the line continuation symbol. For this regex to work, we need
-    # to additionally specify the MULTILINE (we want '^' to match the beginning of any line, not just of the whole text)
-    # and the DOTALL (we want '.*' to be able to cross the line boundaries) flags.
-    comment_line_regex = r'^%x?com:.*?(?=^[^\t])'
+    # Find all the comments except for the LENA comments
     comments_df = pd.DataFrame(
         columns=('text', 'position_in_text'),
         data=[(match.group(), match.start())
-              for match in re.finditer(comment_line_regex, clan_file_text, flags=re.MULTILINE + re.DOTALL)])
+              for match in COMMENT_LINE_REGEX.finditer(clan_file_text)])
     # Remove LENA comments, counting '|' solution comes from pyclan
     comments_df = comments_df[comments_df.text.str.count('\|') <= 3]
     # Add timestamp info
     comments_df = _match_with_timestamps(
         positions_in_text=comments_df,
-        timestamps_df=_extract_timestamps(clan_file_text),
+        timestamps_df=timestamps,
         above=True)
     # Some files have region comments before the first tier and thus they don't get a timestamp, so it will have
     # NaN as offset, which will force pandas to convert the whole column to 'float64' which will cause problems down the
@@ -536,9 +650,7 @@ def _extract_region_info(clan_file_text: str, subregion_count=DEFAULT_SUBREGION_
     listened_but_empty = []  # List of integers - offsets of the corresponding comments
 
     # Code below is copied from annot_distr
-    for comment_row in comments_df.itertuples():
-        comment = comment_row.text
-        row_offset = comment_row.offset
+    for comment, row_offset in zip(comments_df.text, comments_df.offset):
         if 'subregion' in comment:
             if NO_CODEABLE_WORDS_BUT_LISTENED_COMMENT in comment:
                 listened_but_empty.append(row_offset)
@@ -589,12 +701,13 @@ def _extract_region_info(clan_file_text: str, subregion_count=DEFAULT_SUBREGION_
     return region_boundaries_df, subregion_ranks_df, listened_but_empty
 
 
-def _preprocess_region_info(clan_file_text: str, subregion_count=DEFAULT_SUBREGION_COUNT):
+def _preprocess_region_info(clan_file_text: str, subregion_count=DEFAULT_SUBREGION_COUNT, timestamps=None):
     """
     Extract and preprocess region info from the cha files.
     :param clan_file_text: contents of the clan files as a string
     :param subregion_count: expected total number of subregions. Should be 0 for months 6 and 7, and 5 for all other
      months except for a few known exceptions.
+    :param timestamps: output of _extract_timestamps for the same text if the caller already has it
     :return: (regions_raw, regions_processed, subregion_ranks_df, listened_but_empty) where:
         - regions_raw - dataframe with all the regions (possibly overlapping), their onsets, offsets, position within
             regions of the same kind, and the number of annotations in each of them (same annotation can count towards
@@ -606,7 +719,7 @@ def _preprocess_region_info(clan_file_text: str, subregion_count=DEFAULT_SUBREGI
     """
     annotation_timestamps = _extract_annotation_timestamps(clan_file_text)
     regions_raw, subregion_ranks_df, listened_but_empty = _extract_region_info(
-        clan_file_text, subregion_count=subregion_count)
+        clan_file_text, subregion_count=subregion_count, timestamps=timestamps)
 
     # Process regions. For months 6 and 7 that have no subregions, we only need to remove the overlapping parts of
     # the regions.
@@ -628,9 +741,12 @@ def listen_time_stats_for_report(clan_file_text: str, subregion_count=DEFAULT_SU
     :param subregion_count: the number of subregions to expect, most have 5 but some have 4. Months 6 and 7 have zero.
     :return:
     """
-    # Extract the necessary information from the clan file
+    # Extract the necessary information from the clan file. Timestamps are needed both for the regions and for the end
+    # time, so they are extracted once.
+    timestamps = _extract_timestamps(clan_file_text)
     regions_raw, regions_processed, subregion_ranks_df, _ = _preprocess_region_info(clan_file_text=clan_file_text,
-                                                                                    subregion_count=subregion_count)
+                                                                                    subregion_count=subregion_count,
+                                                                                    timestamps=timestamps)
 
     # Calculate total for each region type
     totals_raw = _total_time_and_count_per_region_type(regions_raw)
@@ -656,9 +772,7 @@ def listen_time_stats_for_report(clan_file_text: str, subregion_count=DEFAULT_SU
                       skip_time=totals_processed.total_time.get(RegionType.SKIP.value, 0),
                       silence_time=totals_processed.total_time.get(RegionType.SILENCE.value, 0),
                       silence_raw_hour=milliseconds_to_hours(totals_raw.total_time.get(RegionType.SILENCE.value, 0))))
-    # Note: this can probably be optimized because we already extracted timestamps once - when we looked for annotation
-    # timestamps
-    last_timestamp_offset = _extract_timestamps(clan_file_text).iloc[-1].offset
+    last_timestamp_offset = timestamps.iloc[-1].offset
     stats['end_time'] = last_timestamp_offset
 
     # The total listen time calculation depends on whether the full recording was listened to (month 6 and 7, excluding
@@ -1,3 +1,4 @@
+import functools
 import os
 import subprocess
 import warnings
@@ -381,16 +382,35 @@ def calculate_listen_time_stats_for_cha_file(cha_path):
     return listen_time_stats_for_report(clan_file_text=clan_file_text, subregion_count=subregion_count)
 
 
+@functools.lru_cache(maxsize=16)
+def _preprocess_region_info_cached(cha_path, file_version, subregion_count):
+    """
+    Cached part of preprocess_region_info. All arguments have to be hashable.
+    :param cha_path: absolute path to the clan file
+    :param file_version: a tuple that changes whenever the file does, e.g., (modification time, size)
+    :param subregion_count: see `_preprocess_region_info`
+    """
+    clan_file_text = Path(cha_path).read_text()
+    return _preprocess_region_info(clan_file_text=clan_file_text, subregion_count=subregion_count)
+
+
 def preprocess_region_info(cha_path):
     """
     Extract enough info about the regions from a chat file to calculate listen time stats.
-    This function does a half of what calculate_listen_time_stats_for_cha_file does.
+    This function does a half of what calculate_listen_time_stats_for_cha_file does. The results for the last few files
+    are kept in memory, so processing the same unchanged file again is free.
     :param cha_path: path to the clan file
     :return: see `_preprocess_region_info`
     """
     subregion_count = _get_subregion_count(**_parse_out_child_and_month(cha_path))
-    clan_file_text = Path(cha_path).read_text()
-    return _preprocess_region_info(clan_file_text=clan_file_text, subregion_count=subregion_count)
+    stat = os.stat(cha_path)
+    regions_raw, regions_processed, subregion_ranks_df, listened_but_empty = _preprocess_region_info_cached(
+        os.path.realpath(cha_path), (stat.st_mtime_ns, stat.st_size), subregion_count)
+
+    # Callers get copies so that they can modify them without affecting the cached values
+    if subregion_ranks_df is not None:
+        subregion_ranks_df = subregion_ranks_df.copy()
+    return regions_raw.copy(), regions_processed.copy(), subregion_ranks_df, list(listened_but_empty)
 
 
 def calculate_listen_time_stats_for_all_cha_files():
@@ -171,7 +171,6 @@ def _triage_overlaps(overlaps_df):
 
     overlaps_with_types = (
         overlaps_df
-        .copy()
         .assign(
             month=lambda df: df.recording_id.str.split('_').str[-1],
             one_is_rank_5_subregion=lambda df:
@@ -382,7 +381,7 @@ def reformat_seedlings_nouns_regions(regions_df):
     :param regions_df: The seedlings-nouns regions table.
     :return: The pivoted table.
     """
-    regions_df = regions_df.copy().assign(end=lambda df: _fillna_with_pseudo_inf(df.end))
+    regions_df = regions_df.assign(end=lambda df: _fillna_with_pseudo_inf(df.end))
 
     regions_df = (
         regions_df
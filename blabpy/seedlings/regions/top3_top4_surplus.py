@@ -400,7 +400,7 @@ def _fillna_with_pseudo_inf(series: pd.Series):
     :param series: a numeric pandas series
     :return: a copy with NA values replaced
     """
-    return series.copy().fillna(_get_pseudo_infinity(series))
+    return series.fillna(_get_pseudo_infinity(series))
 
 
 def _pseudo_inf_to_na(series: pd.Series):
@@ -419,7 +419,7 @@ def _pseudo_inf_to_na(series: pd.Series):
     except NotImplementedError as e:
         raise NotImplementedError(f"Can't get a pseudo-infinity for dtype {series.dtype}") from e
 
-    return series.copy().replace(inf, na)
+    return series.replace(inf, na)
 
 
 def _get_pseudo_infinity(series: pd.Series):
@@ -1,7 +1,8 @@
+import numpy as np
 import pandas as pd
 import pytest
 
-from blabpy.seedlings.listened_time import _set_difference_of_intervals, \
+from blabpy.seedlings.listened_time import _set_difference_of_intervals, _subtract_intervals, \
     _remove_interval_from_regions, _remove_silences_and_skips, _total_time_and_count_per_region_type, \
     _remove_subregions, \
     _overlaps_with_interval, RegionType, _assert_no_overlaps, _extract_region_info
@@ -61,6 +62,22 @@ def test__set_difference_of_intervals():
         assert _set_difference_of_intervals(minuend, subtrahend) == correct_difference
 
 
+def test__subtract_intervals():
+    starts, ends = [0, 10, 20, 30], [10, 20, 30, 40]
+    removed_starts, removed_ends = [25, 5, 12, 14, 35], [26, 12, 13, 16, 50]
+
+    # Subtracting the intervals one by one should give the same result
+    correct_result = list()
+    for index, interval in enumerate(zip(starts, ends)):
+        parts = [interval]
+        for subtrahend in zip(removed_starts, removed_ends):
+            parts = [part for minuend in parts for part in _set_difference_of_intervals(minuend, subtrahend)]
+        correct_result.extend((index, start, end) for start, end in parts)
+
+    indices, new_starts, new_ends = _subtract_intervals(*map(np.array, (starts, ends, removed_starts, removed_ends)))
+    assert list(zip(indices, new_starts, new_ends)) == correct_result
+
+
 def test__remove_interval_from_regions():
     regions_list = [pd.DataFrame.from_dict({'start': [0, 4, 8],
                                             'end': [2, 6, 10],
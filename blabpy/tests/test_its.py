@@ -0,0 +1,9 @@
+import pandas as pd
+
+from blabpy.its import Its
+
+
+def test__convert_iso_duration_to_ms():
+    iso_time = pd.Series(['PT0.00S', 'PT259.02S', 'PT3617.45S', 'PT1H2M3.456S', 'PT12S'])
+    expected = pd.Series([0, 259020, 3617450, 3723456, 12000])
+    assert Its._convert_iso_duration_to_ms(iso_time).equals(expected)
@@ -7,6 +7,7 @@ setup(
     python_requires='>=3.7',
     install_requires=['pandas', 'numpy', 'pyarrow', 'pympi-ling', 'pydub', 'StrEnum', 'tqdm', 'click', 'requests',
                       'GitPython', 'pywin32; sys_platform == "win32"', 'pyprojroot'],
+    extras_require={'lxml': ['lxml']},
     include_package_data=True,
     package_data={'blabpy': ['vihi/intervals/etf_templates/*.etf',
                              'vihi/intervals/etf_templates/*.pfsx',